@@ -0,0 +1,20 @@
+"""Build hook that optionally compiles xml2json.py with mypyc.
+
+Set XML2JSON_MYPYC=1 when installing to get a native extension; otherwise the
+pure-Python module is installed. mypy is not a build requirement, so install
+it first and build without isolation::
+
+    pip install mypy && XML2JSON_MYPYC=1 pip install --no-build-isolation .
+"""
+
+import os
+
+from setuptools import setup
+
+ext_modules = []
+if os.environ.get("XML2JSON_MYPYC") == "1":
+    from mypyc.build import mypycify
+
+    ext_modules = mypycify(["xml2json.py"])
+
+setup(ext_modules=ext_modules)